@@ -44,6 +44,7 @@ class T2IModelWrapper(BaseImageLoader):
 
         self.captions = []
         self.file_ids = None
+        self._existing_files = set()
 
         self.device = device
         self.seed = seed
@@ -62,6 +63,11 @@ class T2IModelWrapper(BaseImageLoader):
             if self.file_ids is None:
                 self.file_ids = [i for i in range(len(captions))]
             assert len(self.file_ids) == len(self.captions)
+            if self.use_saved_images:
+                # one scandir pass instead of a stat() per caption on resume
+                self._existing_files = {
+                    e.name for e in os.scandir(self.save_dir) if e.is_file()
+                }
 
     @abstractmethod
     def load_model(self, device: torch.device):
@@ -71,6 +77,22 @@ class T2IModelWrapper(BaseImageLoader):
     def generate(self, caption: str) -> Image.Image:
         """Generate PIL image for provided caption"""
 
+    def generate_batch(self, captions: List[str]) -> List[Image.Image]:
+        """
+        Generate images for a batch of captions. Subclasses whose pipeline
+        accepts a list of prompts should override this with one batched
+        call; note that such an override seeds once per batch, relaxing the
+        per-image determinism below. The default falls back to one
+        generate() call per caption, re-seeding before each so every image
+        is generated from the same RNG state as item-by-item generation.
+        """
+        images = []
+        for caption in captions:
+            if self.seed:
+                set_all_seeds(self.seed)
+            images.append(self.generate(caption))
+        return images
+
     def __len__(self) -> int:
         return len(self.captions)
 
@@ -83,9 +105,24 @@ class T2IModelWrapper(BaseImageLoader):
 
     def _get_saved(self, idx: int) -> Union[None, Image.Image]:
         filepath = self._get_filepath(idx)
-        if os.path.exists(filepath):
+        if filepath and os.path.basename(filepath) in self._existing_files:
             return Image.open(filepath)
 
+    def _save_image(self, idx: int, image: Image.Image) -> Image.Image:
+        if self.save_dir or self.output_format == "JPEG":
+            buf = save_img_to_buffer(image, self.output_format, self.jpeg_quality)
+        if self.save_dir:
+            filepath = self._get_filepath(idx)
+            with open(filepath, "wb") as f:
+                f.write(buf.getbuffer())
+            buf.seek(0)
+            self._existing_files.add(os.path.basename(filepath))
+
+        if self.output_format == "JPEG":
+            image = Image.open(buf)
+
+        return image
+
     def __getitem__(self, idx: int) -> Image.Image:
         if self.seed:
             set_all_seeds(self.seed)
@@ -98,18 +135,34 @@ class T2IModelWrapper(BaseImageLoader):
                 return cached_img
         image = self.generate(caption)
 
-        if self.save_dir or self.output_format == "JPEG":
-            buf = save_img_to_buffer(image, self.output_format, self.jpeg_quality)
-        if self.save_dir:
-            filepath = self._get_filepath(idx)
-            with open(filepath, "wb") as f:
-                f.write(buf.getbuffer())
-            buf.seek(0)
+        return self._save_image(idx, image)
 
-        if self.output_format == "JPEG":
-            image = Image.open(buf)
+    def get_batch(self, idxs: List[int]) -> List[Image.Image]:
+        """
+        Return images for the given indices, generating the missing ones in
+        a single generate_batch() call so batched diffusion pipelines are
+        actually fed batches.
+        """
+        images = {}
+        to_generate = []
+        if self.save_dir and self.use_saved_images:
+            for idx in idxs:
+                cached_img = self._get_saved(idx)
+                if cached_img:
+                    images[idx] = cached_img
+                else:
+                    to_generate.append(idx)
+        else:
+            to_generate = list(idxs)
 
-        return image
+        if to_generate:
+            if self.seed:
+                set_all_seeds(self.seed)
+            generated = self.generate_batch([self.captions[i] for i in to_generate])
+            for idx, image in zip(to_generate, generated):
+                images[idx] = self._save_image(idx, image)
+
+        return [images[idx] for idx in idxs]
 
 
 class ModelWrapperDataloader:
@@ -143,9 +196,8 @@ class ModelWrapperDataloader:
                 break
 
             samples = []
-            for i in range(bs):
-                sample_num = c + i
-                generated_image = self.model_wrapper[sample_num]
+            generated_images = self.model_wrapper.get_batch(list(range(c, c + bs)))
+            for generated_image in generated_images:
                 generated_image = generated_image.convert("RGB")
                 preprocessed_image = self.preprocess_fn(generated_image)
                 samples.append(preprocessed_image)
@@ -1,9 +1,11 @@
+import functools
 import os
 from typing import Dict, List, Optional, Tuple, Union
 
 import clip
 import numpy as np
 import torch
+import torch.nn.functional as F
 from T2IBenchmark.datasets import get_coco_30k_captions, get_coco_fid_stats
 from T2IBenchmark.feature_extractors import BaseFeatureExtractor, InceptionV3FE
 from T2IBenchmark.loaders import (
@@ -21,6 +23,16 @@ from torch.utils.data import DataLoader, Dataset
 from tqdm import tqdm
 
 
+@functools.lru_cache(maxsize=4)
+def _load_clip(name: str, device: torch.device):
+    return clip.load(name, device=device)
+
+
+@functools.lru_cache(maxsize=2)
+def _load_inception(device: torch.device) -> InceptionV3FE:
+    return InceptionV3FE(device)
+
+
 def create_dataset_from_input(
     obj: Union[str, List[str], BaseImageLoader, FIDStats]
 ) -> Union[BaseImageLoader, FIDStats]:
@@ -46,17 +58,82 @@ def create_dataset_from_input(
         raise ValueError(f"Input {obj} has unknown type. See the documentation")
 
 
+class CudaPrefetcher:
+    """
+    Wraps a dataloader and moves the next batch to the GPU on a side CUDA
+    stream while the current batch is being processed, so the host-to-device
+    copy overlaps with compute. Batches should come from a dataloader built
+    with pin_memory=True for the copy to be truly asynchronous.
+    """
+
+    def __init__(self, dataloader, device: torch.device):
+        self.iterator = iter(dataloader)
+        self.device = device
+        self.stream = torch.cuda.Stream(device=device)
+        self.next_batch = None
+        self.preload()
+
+    def preload(self):
+        try:
+            batch = next(self.iterator)
+        except StopIteration:
+            self.next_batch = None
+            return
+        with torch.cuda.stream(self.stream):
+            self.next_batch = batch.to(self.device, non_blocking=True)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> torch.Tensor:
+        if self.next_batch is None:
+            raise StopIteration
+        torch.cuda.current_stream().wait_stream(self.stream)
+        batch = self.next_batch
+        batch.record_stream(torch.cuda.current_stream())
+        self.preload()
+        return batch
+
+
 def get_features_for_dataset(
     dataset: BaseImageLoader,
     feature_extractor: BaseFeatureExtractor,
     verbose: bool = True,
 ) -> np.ndarray:
+    device = getattr(feature_extractor, "device", "cpu")
+    if torch.cuda.is_available() and torch.device(device).type == "cuda":
+        iterator = CudaPrefetcher(dataset, device)
+    else:
+        iterator = dataset
+
+    # sample count, not batch count: DataLoader exposes the underlying
+    # dataset, ModelWrapperDataloader the wrapped model
+    samples = getattr(dataset, "dataset", None)
+    if samples is None:
+        samples = getattr(dataset, "model_wrapper", None)
+    num_samples = len(samples) if samples is not None else None
+
+    out = None
+    offset = 0
     features = []
-    for x in tqdm(dataset, disable=not verbose):
-        feats = feature_extractor.forward(x).numpy()
-        features.append(feats)
+    for x in tqdm(iterator, total=len(dataset), disable=not verbose):
+        feats = feature_extractor.forward(x)
+        if num_samples is not None:
+            if out is None:
+                out = torch.empty(
+                    (num_samples, feats.shape[1]),
+                    dtype=feats.dtype,
+                    device=feats.device,
+                )
+            out[offset : offset + feats.shape[0]] = feats
+            offset += feats.shape[0]
+        else:
+            # unknown-length loader; fall back to list accumulation
+            features.append(feats)
 
-    res_feats = np.concatenate(features)
+    if out is not None:
+        return out.cpu().numpy()
+    res_feats = torch.cat(features).cpu().numpy()
     return res_feats
 
 
@@ -66,7 +143,7 @@ def calculate_fid(
     device: torch.device = "cuda",
     seed: Optional[int] = 42,
     batch_size: int = 128,
-    dataloader_workers: int = 16,
+    dataloader_workers: Optional[int] = None,
     verbose: bool = True,
 ) -> (int, Tuple[dict, dict]):
     """
@@ -88,8 +165,8 @@ def calculate_fid(
         The seed value to ensure reproducibility, by default 42.
     batch_size : int, optional, default=128
         The batch size to use for processing the images, by default 128.
-    dataloader_workers : int, optional, default=16
-        The number of workers for data loading, by default 16.
+    dataloader_workers : int, optional, default=None
+        The number of workers for data loading, by default min(32, cpu count).
     verbose : bool, optional, default=True
         Whether to print progress information, by default True.
 
@@ -103,11 +180,14 @@ def calculate_fid(
     if seed:
         set_all_seeds(seed)
 
+    if dataloader_workers is None:
+        dataloader_workers = min(32, os.cpu_count() or 16)
+
     input1 = create_dataset_from_input(input1)
     input2 = create_dataset_from_input(input2)
 
-    # create inception net
-    inception_fe = InceptionV3FE(device)
+    # create inception net (cached across invocations)
+    inception_fe = _load_inception(device)
 
     stats = []
     all_features = []
@@ -127,6 +207,9 @@ def calculate_fid(
                 shuffle=False,
                 drop_last=False,
                 num_workers=dataloader_workers,
+                pin_memory=True,
+                persistent_workers=dataloader_workers > 0,
+                prefetch_factor=4 if dataloader_workers > 0 else None,
             )
             features = get_features_for_dataset(
                 dataloader, inception_fe, verbose=verbose
@@ -155,17 +238,14 @@ def calculate_coco_fid(
     ModelWrapper: T2IModelWrapper,
     device: torch.device = "cuda",
     seed: Optional[int] = 42,
-    batch_size: int = 1,
+    batch_size: int = 8,
     save_generations_dir: str = "coco_generations/",
 ) -> (int, Tuple[dict, dict]):
     os.makedirs(save_generations_dir, exist_ok=True)
     # get COCO-30k captions
     id2caption = get_coco_30k_captions()
-    captions = []
-    ids = []
-    for d in id2caption.items():
-        ids.append(d[0])
-        captions.append(d[1])
+    ids = list(id2caption.keys())
+    captions = list(id2caption.values())
 
     # init model
     model = ModelWrapper(
@@ -193,10 +273,29 @@ def calculate_clip_score(
     if seed:
         set_all_seeds(seed)
 
-    model, preprocess = clip.load("ViT-B/32", device=device)
+    model, preprocess = _load_clip("ViT-B/32", device)
+
+    # encode every unique caption once; the image loop then just indexes
+    # into this table instead of re-running the text tower per batch
+    text_batch_size = 256
+    unique_captions = list(dict.fromkeys(captions_mapping.values()))
+    caption2row = {caption: i for i, caption in enumerate(unique_captions)}
+    text_features = []
+    use_cuda = torch.device(device).type == "cuda"
+    with torch.inference_mode(), torch.autocast(
+        device_type="cuda", dtype=torch.float16, enabled=use_cuda
+    ):
+        for i in range(0, len(unique_captions), text_batch_size):
+            tokens = clip.tokenize(unique_captions[i : i + text_batch_size]).to(device)
+            text_features.append(model.encode_text(tokens))
+    text_features = F.normalize(torch.cat(text_features).float(), dim=1)
+
+    # map each image path to the row of its caption's embedding, so the
+    # dataset collates small integer indices instead of caption strings
+    path2row = {path: caption2row[captions_mapping[path]] for path in image_paths}
     dataset = CaptionImageDataset(
         images_paths=image_paths,
-        captions_mapping=captions_mapping,
+        captions_mapping=path2row,
         preprocess_fn=preprocess,
     )
 
@@ -206,29 +305,29 @@ def calculate_clip_score(
         shuffle=False,
         drop_last=False,
         num_workers=dataloader_workers,
+        pin_memory=True,
+        persistent_workers=dataloader_workers > 0,
+        prefetch_factor=4 if dataloader_workers > 0 else None,
     )
 
-    score_acc = 0.0
+    score_acc = torch.zeros((), device=device, dtype=torch.float32)
     num_samples = 0
 
-    for images, captions in tqdm(dataloader):
-        images = images.to(device)
-        captions = [clip.tokenize(caption).to(device) for caption in captions]
+    for images, rows in tqdm(dataloader):
+        images = images.to(device, non_blocking=True)
 
-        with torch.no_grad():
+        with torch.inference_mode(), torch.autocast(
+            device_type="cuda", dtype=torch.float16, enabled=use_cuda
+        ):
             image_embeddings = model.encode_image(images)
-            caption_embeddings = model.encode_text(torch.cat(captions))
 
-        image_features = image_embeddings / image_embeddings.norm(dim=1, keepdim=True)
-        caption_features = caption_embeddings / caption_embeddings.norm(
-            dim=1, keepdim=True
-        )
+        image_features = F.normalize(image_embeddings.float(), dim=1)
+        caption_features = text_features[rows.to(device)]
 
-        score = (image_features * caption_features).sum(dim=1).mean().item()
-        score_acc += score * images.size(0)
+        score_acc += (image_features * caption_features).sum(dim=1).sum()
         num_samples += images.size(0)
 
-    clip_score = score_acc / num_samples
+    clip_score = score_acc.item() / num_samples
     if verbose:
         print(f"CLIP score is {clip_score}")
 
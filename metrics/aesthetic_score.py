@@ -1,14 +1,28 @@
 import argparse
+import functools
+import os
 from pathlib import Path
 
 import clip
-import numpy as np
 import pytorch_lightning as pl
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 from PIL import Image
+from torch.utils.data import DataLoader, Dataset
 from torchvision import transforms
 
+try:
+    # libjpeg-turbo decode path for JPEG-heavy corpora; requires the
+    # PyTurboJPEG package and the libturbojpeg system library. PNG decode
+    # benefits from pillow-SIMD instead, which replaces PIL at install time
+    # with no code change needed here.
+    from turbojpeg import TJPF_RGB, TurboJPEG
+
+    _turbo_jpeg = TurboJPEG()
+except Exception:
+    _turbo_jpeg = None
+
 
 class MLP(pl.LightningModule):
     def __init__(self, input_size):
@@ -28,38 +42,74 @@ class MLP(pl.LightningModule):
         return self.layers(x)
 
 
-def normalized(a, axis=-1, order=2):
-    l2 = np.atleast_1d(np.linalg.norm(a, order, axis))
-    l2[l2 == 0] = 1
-    return a / np.expand_dims(l2, axis)
+class AestheticDataset(Dataset):
+    def __init__(self, image_paths, preprocess):
+        self.image_paths = image_paths
+        self.preprocess = preprocess
 
+    def __len__(self):
+        return len(self.image_paths)
 
-def evaluate_images(
-    folder_path, model_path="resources/sac+logos+ava1-l14-linearMSE.pth"
-):
-    device = "cuda" if torch.cuda.is_available() else "cpu"
+    def __getitem__(self, idx):
+        path = self.image_paths[idx]
+        if _turbo_jpeg is not None and path.suffix.lower() in (".jpg", ".jpeg"):
+            with open(path, "rb") as f:
+                image = Image.fromarray(
+                    _turbo_jpeg.decode(f.read(), pixel_format=TJPF_RGB)
+                )
+        else:
+            image = Image.open(path).convert("RGB")
+        return self.preprocess(image)
+
+
+@functools.lru_cache(maxsize=1)
+def _load_models(model_path, device):
     model = MLP(768).to(device)
     model.load_state_dict(torch.load(model_path))
     model.eval()
     model2, preprocess = clip.load("ViT-L/14", device=device)
+    return model, model2, preprocess
+
+
+def evaluate_images(
+    folder_path,
+    model_path="resources/sac+logos+ava1-l14-linearMSE.pth",
+    batch_size=64,
+):
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model, model2, preprocess = _load_models(model_path, device)
 
     path = Path(folder_path)
-    images = list(path.rglob("*.png"))
+    images = sorted(
+        p for p in path.rglob("*") if p.suffix.lower() in {".png", ".jpg", ".jpeg"}
+    )
     scores = []
 
-    for img_path in images:
-        pil_image = Image.open(img_path)
-        image = preprocess(pil_image).unsqueeze(0).to(device)
-
-        with torch.no_grad():
-            image_features = model2.encode_image(image)
-            im_emb_arr = normalized(image_features.cpu().detach().numpy())
-            prediction = model(
-                torch.from_numpy(im_emb_arr).to(device).type(torch.cuda.FloatTensor)
-            )
-            scores.append(prediction.item())
+    if images:
+        dataset = AestheticDataset(images, preprocess)
+        num_workers = min(8, os.cpu_count() or 1)
+        dataloader = DataLoader(
+            dataset,
+            batch_size=batch_size,
+            shuffle=False,
+            num_workers=num_workers,
+            pin_memory=True,
+            persistent_workers=num_workers > 0,
+        )
 
-        print(f"Aesthetic score for {img_path}: {prediction.item()}")
+        for batch in dataloader:
+            with torch.inference_mode(), torch.autocast(
+                device_type="cuda", dtype=torch.float16, enabled=device == "cuda"
+            ):
+                image_features = model2.encode_image(
+                    batch.to(device, non_blocking=True)
+                )
+                im_emb = F.normalize(image_features.float(), dim=-1)
+                prediction = model(im_emb)
+            scores.extend(prediction.squeeze(-1).cpu().tolist())
+
+        for img_path, score in zip(images, scores):
+            print(f"Aesthetic score for {img_path}: {score}")
 
     if scores:
         average_score = sum(scores) / len(scores)